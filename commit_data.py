@@ -4,7 +4,7 @@ from dataclasses_json import dataclass_json
 from datetime import datetime
 
 @dataclass_json
-@dataclass
+@dataclass(slots=True)
 class SPRTResults:
     """Statistics from an LLR (Log Likelihood Ratio) test"""
     llr: float
@@ -18,13 +18,13 @@ class SPRTResults:
     draws: int
 
 @dataclass_json
-@dataclass
+@dataclass(slots=True)
 class FileContent:
     filepath: str
     content: Optional[str]
 
 @dataclass_json
-@dataclass
+@dataclass(slots=True)
 class TestEntry:
     user: str
     engine: str
@@ -43,6 +43,6 @@ class TestEntry:
 
 
 @dataclass_json
-@dataclass
+@dataclass(slots=True)
 class RunEntryList:
     list: List[TestEntry]
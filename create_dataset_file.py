@@ -1,15 +1,23 @@
+import atexit
 import json
 import subprocess
 import argparse
 import sys
 import os
 import re
+import shutil
 import base64 # For the "secret" message
-from typing import Optional, List, Tuple
+import concurrent.futures
+import collections
+from typing import Optional, List, Tuple, Dict, Iterable, Iterator, Callable, TextIO
 import logging
-import difflib # Added for diffing processed content
 import fnmatch # Added for glob pattern matching
-from commit_data import RunEntryList, FileContent
+import functools
+import hashlib
+import tempfile
+import textwrap
+import threading
+from commit_data import RunEntryList, FileContent, TestEntry
 
 
 # --- Logging Configuration ---
@@ -17,9 +25,12 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 
 # --- GitHub URL Parsing and Path Generation ---
+GITHUB_URL_PATTERN = re.compile(r"github\.com[:/]([^/]+)/([^/]+)", re.IGNORECASE)
+
+# Most entries share a handful of repos, so URLs and repo paths are only checked once
+@functools.lru_cache(maxsize=None)
 def parse_github_url(url: str) -> Optional[Tuple[str, str]]:
-    pattern = r"github\.com[:/]([^/]+)/([^/]+)"
-    match = re.search(pattern, url, re.IGNORECASE)
+    match = GITHUB_URL_PATTERN.search(url)
     if not match:
         logging.warning(f"Could not parse GitHub URL: {url}")
         return None
@@ -46,11 +57,21 @@ SUPPORTED_EXTENSIONS_FOR_PROCESSING = (
     '.rs'
 )
 
+# Comments and string/char literals in one alternation, so "//" or "/*" inside a literal is not
+# mistaken for a comment. String literals don't span lines. Char literals hold a single character or
+# escape, so C++14 digit separators (1'000) and Rust lifetimes ('a) never pair up with a later quote.
+C_STYLE_COMMENT_OR_LITERAL_RE = re.compile(
+    r"""//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|'(?:\\(?:x[0-9a-fA-F]+|u\{[0-9a-fA-F]+\}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|[0-7]{1,3}|.)|[^'\\\n])'""",
+    re.DOTALL
+)
+
+def strip_comment_match(match: re.Match) -> str:
+    text = match.group(0)
+    return "" if text.startswith(("//", "/*")) else text
+
 def remove_c_style_comments_regex(code: str) -> str:
     if not code: return ""
-    code = re.sub(r"/\*.*?\*/", "", code, flags=re.DOTALL)
-    code = re.sub(r"//.*?$", "", code, flags=re.MULTILINE)
-    return code
+    return C_STYLE_COMMENT_OR_LITERAL_RE.sub(strip_comment_match, code)
 
 def process_source_file_content(raw_content: Optional[str], filepath: str, remove_comments: bool = False) -> Optional[str]:
     if raw_content is None:
@@ -73,18 +94,27 @@ def process_source_file_content(raw_content: Optional[str], filepath: str, remov
     return content_no_comments
 
 # --- Git Utility Functions ---
+# An absolute executable path and close_fds=False let subprocess use the cheaper posix_spawn()
+# instead of fork()+exec(). Python's own file descriptors are non-inheritable, so nothing leaks.
+GIT_EXECUTABLE = shutil.which("git") or "git"
+
+def decode_git_output(output: bytes) -> str:
+    # Git output is captured as bytes and decoded in one go, with the newline
+    # translation text mode would do. Invalid UTF-8 is replaced instead of failing.
+    return output.decode('utf-8', errors='replace').replace("\r\n", "\n").replace("\r", "\n")
+
 def run_git_command(git_command_args: List[str], bare_repo_path: str) -> Optional[str]:
-    base_command = ["git", f"--git-dir={bare_repo_path}"]
+    base_command = [GIT_EXECUTABLE, f"--git-dir={bare_repo_path}"]
     full_command = base_command + git_command_args
     try:
         process = subprocess.run(
-            full_command, capture_output=True, text=True, check=False, encoding='utf-8'
+            full_command, capture_output=True, check=False, close_fds=False
         )
         if process.returncode != 0:
             logging.error(f"Git command failed for bare repo '{bare_repo_path}': {' '.join(full_command)}")
-            logging.error(f"Stderr: {process.stderr.strip()}")
+            logging.error(f"Stderr: {decode_git_output(process.stderr).strip()}")
             return None
-        return process.stdout.strip()
+        return decode_git_output(process.stdout).strip()
     except FileNotFoundError:
         logging.error("Git command not found. Is Git installed and in PATH?")
         return None
@@ -99,32 +129,121 @@ def get_changed_files_between_commits(base_hash: str, new_hash: str, bare_repo_p
     if base_hash == new_hash:
         logging.info(f"Base hash and new hash are identical ({base_hash}) in bare repo '{bare_repo_path}'. No files changed.")
         return []
-    command_args = ["diff", "--name-only", base_hash, new_hash]
+    # -z prints paths verbatim instead of C-quoting non-ASCII ones
+    command_args = ["diff", "--name-only", "-z", base_hash, new_hash]
     stdout = run_git_command(command_args, bare_repo_path)
     if stdout is None: return None
-    return stdout.splitlines() if stdout else []
+    return [filepath for filepath in stdout.split("\0") if filepath]
 
-def get_raw_file_content_at_commit(commit_hash: str, filepath: str, bare_repo_path: str) -> Optional[str]:
-    if not commit_hash or not filepath: return None
-    command_args = ["show", f"{commit_hash}:{filepath}"]
-    base_command = ["git", f"--git-dir={bare_repo_path}"]
-    full_command = base_command + command_args
-    try:
-        process = subprocess.run(full_command, capture_output=True, text=True, check=False, encoding='utf-8')
-        if process.returncode != 0:
-            stderr_lower = process.stderr.lower()
-            if any(msg in stderr_lower for msg in ["does not exist", "invalid object name", "exists on disk, but not in"]):
-                logging.info(f"File '{filepath}' not found at commit '{commit_hash}' in bare repo '{bare_repo_path}'. Assuming None content.")
-            else:
-                logging.warning(f"Git command failed (get_raw_file_content): {' '.join(full_command)}\nStderr: {process.stderr.strip()}")
-            return None
-        return process.stdout
-    except FileNotFoundError: logging.error("Git command not found."); return None
-    except Exception as e: logging.error(f"Exception during git show {commit_hash}:{filepath} in {bare_repo_path}: {e}"); return None
+class CatFileBatch:
+    """A long-running `git cat-file --batch` process for reading many blobs from one bare repo."""
+
+    def __init__(self, bare_repo_path: str):
+        self.bare_repo_path = bare_repo_path
+        self.process = subprocess.Popen(
+            [GIT_EXECUTABLE, f"--git-dir={bare_repo_path}", "cat-file", "--batch"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, close_fds=False
+        )
 
-def get_file_content_at_commit(commit_hash: str, filepath: str, bare_repo_path: str, remove_comments: bool = False) -> Optional[str]:
-    raw_content = get_raw_file_content_at_commit(commit_hash, filepath, bare_repo_path)
-    return process_source_file_content(raw_content, filepath, remove_comments)
+    def _read_response(self) -> Optional[bytes]:
+        assert self.process.stdout is not None
+        header = self.process.stdout.readline()
+        if not header:
+            raise RuntimeError(f"git cat-file --batch exited unexpectedly for bare repo '{self.bare_repo_path}'")
+        parts = header.split()
+        if len(parts) != 3 or not parts[2].isdigit():
+            # "<object> missing" or "<object> ambiguous", no payload follows. The object name may contain spaces.
+            return None
+        _, object_type, size = parts
+        content = self.process.stdout.read(int(size))
+        self.process.stdout.read(1) # Trailing newline after the payload
+        if object_type != b"blob":
+            return None
+        return content
+
+    def read_many(self, objects: List[Tuple[str, str]]) -> List[Optional[bytes]]:
+        """Pipelines all (commit_hash, filepath) requests and returns the contents in the same order."""
+        assert self.process.stdin is not None
+        stdin = self.process.stdin
+
+        # Requests are written from a separate thread, otherwise both pipes can fill up and deadlock
+        def write_requests() -> None:
+            try:
+                stdin.write("".join(f"{commit_hash}:{filepath}\n" for commit_hash, filepath in objects).encode('utf-8'))
+                stdin.flush()
+            except (BrokenPipeError, ValueError):
+                pass # The reader notices the dead process and raises
+
+        writer = threading.Thread(target=write_requests, daemon=True)
+        writer.start()
+        try:
+            return [self._read_response() for _ in objects]
+        finally:
+            writer.join()
+
+    def close(self) -> None:
+        if self.process.poll() is None:
+            assert self.process.stdin is not None
+            self.process.stdin.close()
+            self.process.wait()
+
+# Least recently used processes are closed, so a worker keeps a few git processes instead of one per repo
+MAX_CAT_FILE_BATCHES = 8
+_cat_file_batches: "collections.OrderedDict[str, CatFileBatch]" = collections.OrderedDict()
+
+def get_cat_file_batch(bare_repo_path: str) -> CatFileBatch:
+    batch = _cat_file_batches.get(bare_repo_path)
+    if batch is not None:
+        _cat_file_batches.move_to_end(bare_repo_path)
+        return batch
+    batch = CatFileBatch(bare_repo_path)
+    _cat_file_batches[bare_repo_path] = batch
+    while len(_cat_file_batches) > MAX_CAT_FILE_BATCHES:
+        _, evicted_batch = _cat_file_batches.popitem(last=False)
+        evicted_batch.close()
+    return batch
+
+def close_cat_file_batches() -> None:
+    for batch in _cat_file_batches.values():
+        batch.close()
+    _cat_file_batches.clear()
+
+atexit.register(close_cat_file_batches)
+
+def reset_cat_file_batch(bare_repo_path: str) -> None:
+    # The stream may be out of sync after a failure, start a fresh process on the next read
+    batch = _cat_file_batches.pop(bare_repo_path, None)
+    if batch is not None:
+        batch.process.kill()
+        batch.close()
+
+def decode_file_content(content: Optional[bytes], commit_hash: str, filepath: str, bare_repo_path: str) -> Optional[str]:
+    if content is None:
+        logging.info(f"File '{filepath}' not found at commit '{commit_hash}' in bare repo '{bare_repo_path}'. Assuming None content.")
+        return None
+    return decode_git_output(content)
+
+def get_raw_file_contents_at_commits(objects: List[Tuple[str, str]], bare_repo_path: str) -> List[Optional[str]]:
+    """Reads all (commit_hash, filepath) pairs through one pipelined cat-file stream, in order."""
+    # cat-file reads one request per line, a path with a newline would desync the stream. Such files are treated as missing.
+    valid_objects = [
+        (commit_hash, filepath) for commit_hash, filepath in objects
+        if commit_hash and filepath and "\n" not in filepath
+    ]
+    if not valid_objects:
+        return [None] * len(objects)
+    try:
+        contents = dict(zip(valid_objects, get_cat_file_batch(bare_repo_path).read_many(valid_objects)))
+    except FileNotFoundError: logging.error("Git command not found."); return [None] * len(objects)
+    except Exception as e:
+        logging.error(f"Exception during git cat-file batch read of {len(valid_objects)} objects in {bare_repo_path}: {e}")
+        reset_cat_file_batch(bare_repo_path)
+        return [None] * len(objects)
+    return [
+        decode_file_content(contents[(commit_hash, filepath)], commit_hash, filepath, bare_repo_path)
+        if (commit_hash, filepath) in contents else None
+        for commit_hash, filepath in objects
+    ]
 
 def get_simple_diff_between_commits(base_hash: str, new_hash: str, changed_files: List[str], bare_repo_path: str) -> Optional[str]:
     if not base_hash or not new_hash: return ""
@@ -132,57 +251,123 @@ def get_simple_diff_between_commits(base_hash: str, new_hash: str, changed_files
     command_args = ["diff", "--no-prefix", base_hash, new_hash, "--"] + changed_files
     return run_git_command(command_args, bare_repo_path)
 
-def get_processed_diff_between_commits(
+def write_file_for_diff(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+
+def format_added_or_deleted_file_diff(filepath: str, content: str, added: bool) -> str:
+    """Builds the diff of a file that only exists on one side, in the format `git diff` uses."""
+    data = content.encode('utf-8')
+    blob_hash = hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()[:7]
+    lines = content.split("\n")
+    missing_newline = lines[-1] != ""
+    if not missing_newline:
+        lines.pop()
+
+    # Git ends file names containing spaces with a tab in the ---/+++ lines, and leaves those lines out for empty files
+    name_end = "\t" if " " in filepath else ""
+    if added:
+        header = [f"diff --git a/{filepath} b/{filepath}", "new file mode 100644", f"index 0000000..{blob_hash}"]
+        file_lines = ["--- /dev/null", f"+++ b/{filepath}{name_end}"]
+    else:
+        header = [f"diff --git a/{filepath} b/{filepath}", "deleted file mode 100644", f"index {blob_hash}..0000000"]
+        file_lines = [f"--- a/{filepath}{name_end}", "+++ /dev/null"]
+    if not lines:
+        return "\n".join(header) + "\n"
+
+    prefix = "+" if added else "-"
+
+    line_range = "1" if len(lines) == 1 else f"1,{len(lines)}"
+    hunk_header = f"@@ -0,0 +{line_range} @@" if added else f"@@ -{line_range} +0,0 @@"
+    diff_lines = header + file_lines + [hunk_header] + [prefix + line for line in lines]
+    if missing_newline:
+        diff_lines.append("\\ No newline at end of file")
+    return "\n".join(diff_lines) + "\n"
+
+def get_no_index_diffs(modified_files: List[Tuple[str, str, str]]) -> Optional[Dict[str, str]]:
+    """Diffs (filepath, old_content, new_content) triples with one `git diff --no-index` call, returns the diff per file."""
+    # The versions are written to 'a/' and 'b/' trees and diffed by git, which is much faster than difflib on large files.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for filepath, old_content, new_content in modified_files:
+            write_file_for_diff(os.path.join(temp_dir, "a", filepath), old_content)
+            write_file_for_diff(os.path.join(temp_dir, "b", filepath), new_content)
+
+        # `-C` instead of `cwd=` keeps the posix_spawn() fast path
+        diff_command = [
+            GIT_EXECUTABLE, "-C", temp_dir, "-c", "core.quotePath=false",
+            "diff", "--no-index", "--no-prefix", "--no-color", "--no-ext-diff", "--no-renames", "--", "a", "b"
+        ]
+        try:
+            process = subprocess.run(diff_command, capture_output=True, check=False, close_fds=False)
+        except FileNotFoundError: logging.error("Git command not found."); return None
+        except Exception as e: logging.error(f"Exception during {' '.join(diff_command)}: {e}"); return None
+
+    # `git diff --no-index` exits with 1 if there are differences
+    if process.returncode not in (0, 1):
+        logging.error(f"Git command failed: {' '.join(diff_command)}")
+        logging.error(f"Stderr: {decode_git_output(process.stderr).strip()}")
+        return None
+
+    # Each file section starts with "diff --git a/<filepath> b/<filepath>"
+    file_diffs: Dict[str, str] = {}
+    for file_diff in re.split(r"^(?=diff --git )", decode_git_output(process.stdout), flags=re.MULTILINE):
+        if not file_diff:
+            continue
+        paths = file_diff[len("diff --git "):file_diff.find("\n")]
+        filepath = paths[2:2 + (len(paths) - 5) // 2]
+        if paths != f"a/{filepath} b/{filepath}":
+            filepath = paths # Unexpected header, keep the section anyway
+        file_diffs[filepath] = file_diff
+    return file_diffs
+
+def get_processed_file_contents(
     base_hash: str,
     new_hash: str,
     changed_files: List[str],
     bare_repo_path: str,
     remove_comments: bool = False
+) -> Tuple[List[Optional[str]], List[Optional[str]]]:
+    """Reads the old and new version of every changed file with one batched read and processes them."""
+    raw_contents = get_raw_file_contents_at_commits(
+        [(base_hash, filepath) for filepath in changed_files] + [(new_hash, filepath) for filepath in changed_files],
+        bare_repo_path
+    )
+    processed_contents = [
+        process_source_file_content(raw_content, filepath, remove_comments)
+        for raw_content, filepath in zip(raw_contents, changed_files + changed_files)
+    ]
+    return processed_contents[:len(changed_files)], processed_contents[len(changed_files):]
+
+def get_diff_of_processed_contents(
+    changed_files: List[str],
+    processed_old_contents: List[Optional[str]],
+    processed_new_contents: List[Optional[str]]
 ) -> Optional[str]:
-    if not base_hash or not new_hash:
-        logging.warning("Base hash or new hash is empty for diff generation. Returning empty diff.")
-        return ""
-    if not changed_files or base_hash == new_hash:
-        logging.info(f"No changed files or hashes are identical ({base_hash}) for diff. Returning empty diff.")
-        return ""
-
-    all_diff_lines: List[str] = []
-
-    for filepath in changed_files:
-        processed_old_content_str = get_file_content_at_commit(base_hash, filepath, bare_repo_path, remove_comments)
-        processed_new_content_str = get_file_content_at_commit(new_hash, filepath, bare_repo_path, remove_comments)
-
-        old_lines = processed_old_content_str.splitlines(keepends=True) if processed_old_content_str is not None else []
-        new_lines = processed_new_content_str.splitlines(keepends=True) if processed_new_content_str is not None else []
-
-        # Check if both raw contents were None (file not found at commit, which is fine)
-        # and resulted in None processed content. If so, and they are both None, skip diff for this file.
-        raw_old_content_existed = get_raw_file_content_at_commit(base_hash, filepath, bare_repo_path) is not None
-        raw_new_content_existed = get_raw_file_content_at_commit(new_hash, filepath, bare_repo_path) is not None
-
-        if processed_old_content_str is None and processed_new_content_str is None and \
-           not raw_old_content_existed and not raw_new_content_existed:
+    file_diffs: Dict[str, str] = {}
+    modified_files: List[Tuple[str, str, str]] = []
+    for filepath, processed_old_content_str, processed_new_content_str in zip(changed_files, processed_old_contents, processed_new_contents):
+        # File did not exist at base or new commit (which is fine), nothing to diff.
+        if processed_old_content_str is None and processed_new_content_str is None:
             logging.debug(f"File '{filepath}' likely did not exist at base or new commit, or was not processable. Skipping diff contribution.")
-            continue
-
-        fromfile = f"a/{filepath}"
-        tofile = f"b/{filepath}"
-
-        file_diff_lines = list(difflib.unified_diff(
-            old_lines,
-            new_lines,
-            fromfile=fromfile,
-            tofile=tofile,
-        ))
-
-        all_diff_lines.extend(file_diff_lines)
+        # Added and deleted files are diffed against nothing, no need to hand them to git
+        elif processed_old_content_str is None:
+            file_diffs[filepath] = format_added_or_deleted_file_diff(filepath, processed_new_content_str, added=True)
+        elif processed_new_content_str is None:
+            file_diffs[filepath] = format_added_or_deleted_file_diff(filepath, processed_old_content_str, added=False)
+        else:
+            modified_files.append((filepath, processed_old_content_str, processed_new_content_str))
 
-    if not all_diff_lines:
-        logging.info(f"Generated diff for '{new_hash}' vs '{base_hash}' is empty after processing changes in files: {changed_files}.")
-        return ""
+    if modified_files:
+        modified_file_diffs = get_no_index_diffs(modified_files)
+        if modified_file_diffs is None:
+            return None
+        file_diffs.update(modified_file_diffs)
 
-    return "".join(all_diff_lines)
+    # Keep the order of changed_files, like `git diff` does for the unprocessed diff
+    return "".join(file_diffs.pop(filepath, "") for filepath in changed_files) + "".join(file_diffs.values())
 
+@functools.lru_cache(maxsize=None)
 def is_bare_repo(repo_path: str) -> bool:
     if not os.path.isdir(repo_path): return False
     return all([
@@ -192,22 +377,116 @@ def is_bare_repo(repo_path: str) -> bool:
         not os.path.isdir(os.path.join(repo_path, ".git"))
     ])
 
-def matches_filter_patterns(changed_files: List[str], filter_patterns: List[str]) -> bool:
+@functools.lru_cache(maxsize=None)
+def compile_filter_patterns(filter_patterns: Tuple[str, ...]) -> re.Pattern:
+    """Combines the glob patterns into one regex, so each file needs only a single match."""
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in filter_patterns))
+
+def matches_filter_patterns(changed_files: List[str], filter_patterns: Optional[List[str]]) -> bool:
     """Check if ALL changed files match at least one filter pattern using glob matching."""
     if not filter_patterns:
         return True  # No filter means accept all
 
+    if not changed_files:
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info(f"No files changed, but filter patterns {filter_patterns} were provided.")
+        return False
+
+    filter_re = compile_filter_patterns(tuple(filter_patterns))
     for changed_file in changed_files:
-        file_matches_any_pattern = False
-        for pattern in filter_patterns:
-            if fnmatch.fnmatch(changed_file, pattern):
-                file_matches_any_pattern = True
-                break
-        if not file_matches_any_pattern:
+        if not filter_re.fullmatch(changed_file):
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info(f"Changed file '{changed_file}' does not match any filter pattern in {filter_patterns}.")
             return False
     return True
 
+def serialize_entry(entry: TestEntry) -> str:
+    """The entry as it appears inside RunEntryList.to_json(indent=4)."""
+    return textwrap.indent(entry.to_json(indent=4), " " * 8) # type: ignore
+
+def write_run_entry_list_json(serialized_entries: Iterable[str], f: TextIO) -> int:
+    """Writes entries from serialize_entry one at a time, laid out exactly like RunEntryList.to_json(indent=4). Returns the number of entries."""
+    num_entries = 0
+    f.write('{\n    "list": [')
+    for serialized_entry in serialized_entries:
+        f.write(",\n" if num_entries else "\n")
+        f.write(serialized_entry)
+        num_entries += 1
+    f.write("\n    ]\n}" if num_entries else "]\n}")
+    return num_entries
+
 # --- Main Script Logic ---
+def enrich_entry(i: int, entry: TestEntry, num_entries: int, repos_base_dir: str, remove_comments: bool, filter_paths: Optional[List[str]]) -> TestEntry:
+    """Adds the git diff and the old/new file versions to one entry. Skipped entries are returned unchanged."""
+    logging.info(f"Processing entry {i+1}/{num_entries}: User '{entry.user}', NewHash '{entry.new_hash}', {entry.date}")
+
+    bare_repo_local_path = get_repo_local_path(entry.url, repos_base_dir)
+    if not bare_repo_local_path:
+        logging.error(f"Cannot determine repo path for URL '{entry.url}'. Skipping."); return entry
+    if not is_bare_repo(bare_repo_local_path):
+        logging.error(f"Path '{bare_repo_local_path}' (from URL '{entry.url}') is not a valid bare Git repo. Skipping."); return entry
+
+    if not entry.base_hash or not entry.new_hash:
+        logging.warning(f"Skipping entry for new_hash '{entry.new_hash}' in '{bare_repo_local_path}': missing base_hash or new_hash."); return entry
+
+    actual_changed_files = get_changed_files_between_commits(entry.base_hash, entry.new_hash, bare_repo_local_path)
+    if actual_changed_files is None:
+        logging.error(f"Cannot get changed files for new_hash '{entry.new_hash}' in '{bare_repo_local_path}'. Skipping."); return entry
+
+    # Apply filtering using glob pattern matching
+    if not matches_filter_patterns(actual_changed_files, filter_paths):
+        return entry # Skip this entry
+    logging.info(f"Entry '{entry.new_hash}' matches filter criteria with changed files: {actual_changed_files} and patterns {filter_paths}")
+
+    # The file versions are read once and shared by the processed diff and the stored contents
+    old_contents, new_contents = get_processed_file_contents(
+        entry.base_hash, entry.new_hash, actual_changed_files, bare_repo_local_path, remove_comments
+    )
+
+    # Generate diff based on whether comment removal is enabled
+    if remove_comments:
+        print(" Applying strict sanitization protocols...")
+        entry.git_diff = get_diff_of_processed_contents(actual_changed_files, old_contents, new_contents)
+    else:
+        entry.git_diff = get_simple_diff_between_commits(
+            entry.base_hash,
+            entry.new_hash,
+            actual_changed_files,
+            bare_repo_local_path
+        )
+
+    if entry.git_diff is None:
+        logging.error(f"Could not generate git diff for entry with new_hash '{entry.new_hash}'. Git diff will be empty string.");
+        entry.git_diff = ""
+
+    current_old_files = [FileContent(filepath=filepath, content=content) for filepath, content in zip(actual_changed_files, old_contents)]
+    current_new_files = [FileContent(filepath=filepath, content=content) for filepath, content in zip(actual_changed_files, new_contents)]
+
+    entry.old_file_versions = current_old_files
+    entry.new_file_versions = current_new_files
+
+    logging.info(f"Successfully enriched entry for new_hash '{entry.new_hash}' from '{bare_repo_local_path}'.")
+    return entry
+
+ENTRY_CHUNK_SIZE = 8 # Entries per task sent to a worker process
+
+def enrich_and_serialize_entries(indexed_entries: List[Tuple[int, TestEntry]], num_entries: int, repos_base_dir: str, remove_comments: bool, filter_paths: Optional[List[str]]) -> List[str]:
+    # Serializing is slow pure Python too, so it happens in the workers instead of the writing main process
+    return [
+        serialize_entry(enrich_entry(i, entry, num_entries, repos_base_dir, remove_comments, filter_paths))
+        for i, entry in indexed_entries
+    ]
+
+def map_in_order_bounded(executor: concurrent.futures.Executor, fn: Callable, chunks: Iterable, max_in_flight: int) -> Iterator:
+    """Like executor.map over chunks with flattened results, but submits at most max_in_flight chunks ahead of the consumer."""
+    in_flight: collections.deque = collections.deque()
+    for chunk in chunks:
+        if len(in_flight) >= max_in_flight:
+            yield from in_flight.popleft().result()
+        in_flight.append(executor.submit(fn, chunk))
+    while in_flight:
+        yield from in_flight.popleft().result()
+
 def main():
     # --- "Encoded" Message ---
     print("\n" + "=" * 75)
@@ -257,6 +536,7 @@ def main():
             "*search/engine.*",
         ],
         help="Process only entries whose changes are EXCLUSIVELY within these relative file paths.")
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count(), help="Number of worker processes used to enrich entries in parallel.")
     args = parser.parse_args()
 
     print(f"remove_comments: {args.remove_comments}")
@@ -273,92 +553,38 @@ def main():
     except json.JSONDecodeError: logging.error(f"Malformed JSON in input: {args.input}"); sys.exit(1)
     except Exception as e: logging.error(f"Could not parse input JSON: {e}"); sys.exit(1)
 
-    for i, entry in enumerate(run_entry_list_data.list):
-        logging.info(f"Processing entry {i+1}/{len(run_entry_list_data.list)}: User '{entry.user}', NewHash '{entry.new_hash}', {entry.date}")
-
-        bare_repo_local_path = get_repo_local_path(entry.url, args.repos_base_dir)
-        if not bare_repo_local_path:
-            logging.error(f"Cannot determine repo path for URL '{entry.url}'. Skipping."); continue
-        if not is_bare_repo(bare_repo_local_path):
-            logging.error(f"Path '{bare_repo_local_path}' (from URL '{entry.url}') is not a valid bare Git repo. Skipping."); continue
-
-        if not entry.base_hash or not entry.new_hash:
-            logging.warning(f"Skipping entry for new_hash '{entry.new_hash}' in '{bare_repo_local_path}': missing base_hash or new_hash."); continue
-
-        actual_changed_files = get_changed_files_between_commits(entry.base_hash, entry.new_hash, bare_repo_local_path)
-        if actual_changed_files is None:
-            logging.error(f"Cannot get changed files for new_hash '{entry.new_hash}' in '{bare_repo_local_path}'. Skipping."); continue
-
-        # Apply filtering using glob pattern matching (from no_comments version)
-        user_filter_paths_list = args.filter_paths if args.filter_paths is not None else None
-        if user_filter_paths_list is not None:
-            if not actual_changed_files:
-                 if user_filter_paths_list:
-                     logging.info(f"Skipping '{entry.new_hash}': No files changed, but filter patterns {user_filter_paths_list} were provided."); continue
-                 else:
-                     # No changed files and no filter patterns provided, this is fine
-                     pass
-            else:
-                # Check if ALL changed files match at least one pattern
-                all_changed_files_match = True
-                for changed_file in actual_changed_files:
-                    file_matches_any_pattern = False
-                    for pattern in user_filter_paths_list:
-                        if fnmatch.fnmatch(changed_file, pattern):
-                            file_matches_any_pattern = True
-                            break # Found a match for this file, move to the next changed file
-                    if not file_matches_any_pattern:
-                        logging.info(f"Skipping '{entry.new_hash}': Changed file '{changed_file}' does not match any filter pattern in {user_filter_paths_list}.");
-                        all_changed_files_match = False
-                        break # This entry doesn't match the filter, skip it
-
-                if not all_changed_files_match:
-                    continue # Skip this entry
-
-            logging.info(f"Entry '{entry.new_hash}' matches filter criteria with changed files: {actual_changed_files} and patterns {user_filter_paths_list}")
-
-        # Generate diff based on whether comment removal is enabled
-        if args.remove_comments:
-            if args.remove_comments:
-                print(" Applying strict sanitization protocols...")
-            entry.git_diff = get_processed_diff_between_commits(
-                entry.base_hash,
-                entry.new_hash,
-                actual_changed_files,
-                bare_repo_local_path,
-                remove_comments=True
-            )
-        else:
-            entry.git_diff = get_simple_diff_between_commits(
-                entry.base_hash,
-                entry.new_hash,
-                actual_changed_files,
-                bare_repo_local_path
-            )
-
-        if entry.git_diff is None:
-            logging.error(f"Could not generate git diff for entry with new_hash '{entry.new_hash}'. Git diff will be empty string.");
-            entry.git_diff = ""
-
-        # Get file contents (with or without comment removal)
-        current_old_files: List[FileContent] = []
-        current_new_files: List[FileContent] = []
-        for filepath in actual_changed_files:
-            old_content = get_file_content_at_commit(entry.base_hash, filepath, bare_repo_local_path, args.remove_comments)
-            new_content = get_file_content_at_commit(entry.new_hash, filepath, bare_repo_local_path, args.remove_comments)
-            current_old_files.append(FileContent(filepath=filepath, content=old_content))
-            current_new_files.append(FileContent(filepath=filepath, content=new_content))
-
-        entry.old_file_versions = current_old_files
-        entry.new_file_versions = current_new_files
-
-        logging.info(f"Successfully enriched entry for new_hash '{entry.new_hash}' from '{bare_repo_local_path}'.")
-
+    # Entries are independent, so they are enriched in worker processes. Each worker keeps
+    # its own cat-file processes, the main process only collects results and writes the output.
+    num_entries = len(run_entry_list_data.list)
+    enrich = functools.partial(
+        enrich_and_serialize_entries,
+        num_entries=num_entries,
+        repos_base_dir=args.repos_base_dir,
+        remove_comments=args.remove_comments,
+        filter_paths=args.filter_paths
+    )
+    # Entries are written as soon as they are enriched (in input order). Only a window of
+    # chunks is submitted ahead of the writer, so finished results can't pile up in memory.
+    num_workers = args.num_workers or os.cpu_count() or 1
+    entry_chunks = (
+        [(i, run_entry_list_data.list[i]) for i in range(start, min(start + ENTRY_CHUNK_SIZE, num_entries))]
+        for start in range(0, num_entries, ENTRY_CHUNK_SIZE)
+    )
+    # Streamed into a temporary file next to the output, which replaces the output only once every
+    # entry is written. A failing worker never leaves a truncated output behind.
     try:
-        output_json = run_entry_list_data.to_json(indent=4) # type: ignore
-        with open(args.output, 'w', encoding='utf-8') as f:
-            f.write(output_json)
-        logging.info(f"Successfully wrote {len(run_entry_list_data.list)} processed entries to {args.output}")
+        output_dir = os.path.dirname(os.path.abspath(args.output))
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=output_dir, suffix='.tmp', delete=False) as f:
+            try:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+                    serialized_entries = map_in_order_bounded(executor, enrich, entry_chunks, max_in_flight=2 * num_workers)
+                    num_written = write_run_entry_list_json(serialized_entries, f)
+            except BaseException:
+                f.close()
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, args.output)
+        logging.info(f"Successfully wrote {num_written} processed entries to {args.output}")
     except Exception as e:
         logging.error(f"Could not write output JSON to {args.output}: {e}"); sys.exit(1)
 
@@ -1,64 +1,53 @@
 from dataclasses import dataclass
 from typing import Optional
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import re
 import time
-from mirror_repos import mirror_and_check_commits
+from mirror_repos import mirror_and_check_commits_batch
+from scraper_utils import create_session, link_or_copy
 from pathlib import Path
 import shutil
-import requests
 from dataclasses_json import dataclass_json
 from typing import List, Optional
-from tqdm import tqdm
 from commit_data import SPRTResults, TestEntry, RunEntryList
 
-def parse_llr_string(input_string: str) -> SPRTResults:
-    # Remove all whitespace, newlines, and literal '\n'
-    cleaned_string = re.sub(r'\s|\\n', '', input_string)
-
-    # Regular expression patterns to match all required numbers
-    llr_pattern = r'LLR:([-\d.]+)\(([-\d.]+),([-\d.]+)\)\[([-\d.]+),([-\d.]+)\]'
-    total_pattern = r'(?:Total|Games):(\d+)W:(\d+)L:(\d+)D:(\d+)'
-    ptnml_pattern = r'Ptnml\(0-2\):(\d+),(\d+),(\d+),(\d+),(\d+)'
+# Whitespace, newlines and literal '\n' (the page is str() of the raw bytes) may appear between any two tokens
+STATBLOCK_SEPARATOR = r'(?:\s|\\n)*'
+# LLR, totals and the optional pentanomial stats in one pass, in the order OpenBench prints them
+STATBLOCK_PATTERN = re.compile((
+    r'LLR_:_([-\d.]+)_\(_([-\d.]+)_,_([-\d.]+)_\)_\[_([-\d.]+)_,_([-\d.]+)_\]'
+    r'.*?(?:Total|Games)_:_(\d+)_W_:_(\d+)_L_:_(\d+)_D_:_(\d+)'
+    r'(?:.*?Ptnml_\(_0-2_\)_:_(\d+)_,_(\d+)_,_(\d+)_,_(\d+)_,_(\d+))?'
+).replace('_', STATBLOCK_SEPARATOR), re.DOTALL)
 
-    # Extract LLR data
-    llr_match = re.search(llr_pattern, cleaned_string)
-    if not llr_match:
-        raise ValueError("Failed to parse LLR data")
+def parse_llr_string(input_string: str) -> SPRTResults:
+    match = STATBLOCK_PATTERN.search(input_string)
+    if not match:
+        raise ValueError("Failed to parse LLR and total games data")
 
-    # Extract totals data
-    total_match = re.search(total_pattern, cleaned_string)
-    if not total_match:
-        raise ValueError("Failed to parse total games data")
+    llr, lower_bound, upper_bound, elo0, elo1 = match.group(1, 2, 3, 4, 5)
+    total, wins, losses, draws = match.group(6, 7, 8, 9)
 
     # Extract pentanomial data
-    ptnml_match = re.search(ptnml_pattern, cleaned_string)
     pentanomial = []
-    if not ptnml_match:
+    if match.group(10) is None:
         print("WARNING: Failed to parse pentanomial data")
     else:
-        pentanomial = [
-            int(ptnml_match.group(1)),
-            int(ptnml_match.group(2)),
-            int(ptnml_match.group(3)),
-            int(ptnml_match.group(4)),
-            int(ptnml_match.group(5))
-        ]
-
+        pentanomial = [int(count) for count in match.group(10, 11, 12, 13, 14)]
 
     result = SPRTResults(
-        llr=float(llr_match.group(1)),
-        lower_bound=float(llr_match.group(2)),
-        upper_bound=float(llr_match.group(3)),
-        elo0=float(llr_match.group(4)),
-        elo1=float(llr_match.group(5)),
-        wins=int(total_match.group(2)),
-        losses=int(total_match.group(3)),
-        draws=int(total_match.group(4)),
+        llr=float(llr),
+        lower_bound=float(lower_bound),
+        upper_bound=float(upper_bound),
+        elo0=float(elo0),
+        elo1=float(elo1),
+        wins=int(wins),
+        losses=int(losses),
+        draws=int(draws),
         pentanomial=pentanomial
     )
 
-    if int(total_match.group(1)) != result.wins + result.draws + result.losses:
+    if int(total) != result.wins + result.draws + result.losses:
         raise ValueError("Inconsistency between number of total games and sum of wins + losses + draws")
 
     return result
@@ -73,18 +62,16 @@ def parse_test_entries(html_content: str) -> list[TestEntry]:
     Returns:
         List of TestEntry objects containing the parsed data
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    # lxml is a C parser, and only building the test table skips the rest of the page
+    soup = BeautifulSoup(html_content, 'lxml', parse_only=SoupStrainer('table', class_='test-list'))
     test_table = soup.find('table', class_='test-list')
     entries = []
 
     if not test_table:
         return entries
 
-    for row in test_table.find_all('tr'):
-        # Skip header and spacer rows
-        if row.get('class') and any(cls in row.get('class') for cls in ['table-header', 'table-spacer', 'table-spacer-small']):
-            continue
-
+    # Skip header and spacer rows
+    for row in test_table.select('tr:not(.table-header):not(.table-spacer):not(.table-spacer-small)'):
         cells = row.find_all('td')
         if len(cells) == 6:  # Valid test entry row
             user = cells[0].find('a').text
@@ -120,6 +107,8 @@ def main():
     RESULT_DIR = "resources/results_openbench"
     GIT_REPO_DIR = RESULT_DIR + "/git_repos"
     TEST_JSON_FILE_NAME = RESULT_DIR + "/tests.json"
+    # One entry per line, appended while scraping. tests.json is written once scraping stops.
+    TEST_JSONL_FILE_NAME = RESULT_DIR + "/tests.jsonl"
     INSTANCES = [
         "http://chess.grantnet.us",
         "https://chess.swehosting.se",
@@ -141,78 +130,85 @@ def main():
 
     if Path(RESULT_DIR).exists():
         backup_dir = RESULT_DIR + "_backup"
-        shutil.copytree(RESULT_DIR, backup_dir)
-        Path(TEST_JSON_FILE_NAME).unlink(missing_ok=True)
+        shutil.copytree(RESULT_DIR, backup_dir, copy_function=link_or_copy)
 
+    Path(RESULT_DIR).mkdir(parents=True, exist_ok=True)
     run_entries = RunEntryList([])
+    session = create_session()
     num_exists = 0
 
-    for instance in INSTANCES:
-
-        page = 1
-        while True:
-
-            url = f"{instance}/index/{page}"
-            time.sleep(0.1)
-            try:
-                response = requests.get(url)
-            except Exception as e:
-                print(e)
-                print("Waiting a bit, because we couldn't get this url:", url)
-                time.sleep(10.0)
-                print("Trying again")
-                continue
-
-            html_content = str(response.content)
-
-            # print(html_content)
-
-            # assert False
-
-            entries = parse_test_entries(html_content)
-
-            if len(entries) == 0:
-                break
-
-            for entry in tqdm(entries, leave=False):
-                # print(f"\nTest Entry:")
-                # print(f"User: {entry.user}")
-                # print(f"Engine: {entry.engine}")
-                # print(f"Test Name: {entry.testname}")
-                # print(f"URL: {entry.url}")
-                # print(f"Time Control: {entry.time_control}")
-
-                # if entry.llr_stats:
-                #     print("LLR Statistics:")
-                #     print(f"  Current LLR: {entry.llr_stats.llr:.2f}")
-                #     print(f"  Confidence Interval: ({entry.llr_stats.lower_bound:.2f}, {entry.llr_stats.upper_bound:.2f})")
-                #     print(f"  Test Interval: [{entry.llr_stats.elo0:.2f}, {entry.llr_stats.elo1:.2f}]")
-                # else:
-                #     print("No LLR statistics available")
-
-
-                repo_url = entry.url.split('/compare')[0]
-                commits = entry.url.split('/')[-1].split('..')
-
-                # print(entry.url)
-                # print(repo_url)
-                # print(commits)
-
-                if len(commits) != 2:
-                    print("WARNING: Test has not two commit hashes:", entry.url)
-                else:
-                    commit1, commit2 = commits
-                    entry.base_hash, entry.new_hash, entry.exists = mirror_and_check_commits(GIT_REPO_DIR, repo_url, commit1, commit2)
-                    if entry.exists:
-                        num_exists += 1
-
-                run_entries.list.append(entry)
-
-
-            print(f"{num_exists}/{len(run_entries.list)} exist")
-            print("Finished page", page, "of", instance)
-            page += 1
-
+    with open(TEST_JSONL_FILE_NAME, "w") as progress_file:
+        try:
+            for instance in INSTANCES:
+
+                page = 1
+                while True:
+
+                    url = f"{instance}/index/{page}"
+                    time.sleep(0.1)
+                    try:
+                        response = session.get(url, timeout=30)
+                    except Exception as e:
+                        print(e)
+                        print("Waiting a bit, because we couldn't get this url:", url)
+                        time.sleep(10.0)
+                        print("Trying again")
+                        continue
+
+                    html_content = str(response.content)
+
+                    # print(html_content)
+
+                    # assert False
+
+                    entries = parse_test_entries(html_content)
+
+                    if len(entries) == 0:
+                        break
+
+                    # Different repos of this page are mirrored and checked in parallel
+                    commit_checks = {}
+                    for i, entry in enumerate(entries):
+                        commits = entry.url.split('/')[-1].split('..')
+                        if len(commits) == 2:
+                            commit_checks[i] = (GIT_REPO_DIR, entry.url.split('/compare')[0], *commits)
+                    checked_commits = dict(zip(commit_checks, mirror_and_check_commits_batch(list(commit_checks.values()))))
+
+                    for i, entry in enumerate(entries):
+                        # print(f"\nTest Entry:")
+                        # print(f"User: {entry.user}")
+                        # print(f"Engine: {entry.engine}")
+                        # print(f"Test Name: {entry.testname}")
+                        # print(f"URL: {entry.url}")
+                        # print(f"Time Control: {entry.time_control}")
+
+                        # if entry.llr_stats:
+                        #     print("LLR Statistics:")
+                        #     print(f"  Current LLR: {entry.llr_stats.llr:.2f}")
+                        #     print(f"  Confidence Interval: ({entry.llr_stats.lower_bound:.2f}, {entry.llr_stats.upper_bound:.2f})")
+                        #     print(f"  Test Interval: [{entry.llr_stats.elo0:.2f}, {entry.llr_stats.elo1:.2f}]")
+                        # else:
+                        #     print("No LLR statistics available")
+
+
+                        if i not in checked_commits:
+                            print("WARNING: Test has not two commit hashes:", entry.url)
+                        else:
+                            entry.base_hash, entry.new_hash, entry.exists = checked_commits[i]
+                            if entry.exists:
+                                num_exists += 1
+
+                        run_entries.list.append(entry)
+                        progress_file.write(entry.to_json() + "\n")
+
+
+                    print(f"{num_exists}/{len(run_entries.list)} exist")
+                    print("Finished page", page, "of", instance)
+                    page += 1
+
+                    progress_file.flush()
+        finally:
+            # Also written when scraping is interrupted, so the pages scraped so far are kept
             with open(TEST_JSON_FILE_NAME, "w") as out_file:
                 out_file.write(run_entries.to_json(indent=2))
 
@@ -4,169 +4,435 @@ from pathlib import Path
 import requests
 import tempfile
 import time
+import random
+import json
+import threading
+import fcntl
+import functools
+import re
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from scraper_utils import create_session
 
 # TODO add logging
 
-def add_orphaned_commit(clone_dir, repo_url, commit_hash):
-    # Extract commit hash from URL
-    # commit_hash = commit_url.rstrip('/').split('/')[-1]
-
-    # Setup API URL
-    user_and_repo = repo_url.split("github.com/")[1]
-    api_url = f"https://api.github.com/repos/{user_and_repo}/commits/{commit_hash}"
-
-    # print("api_url:", api_url)
-
-    # print(f"<{os.environ.get('GITHUB_TOKEN')}>")
-
-    headers = {
-        'Authorization': f"token {os.environ.get('GITHUB_TOKEN')}",
-        'Accept': 'application/vnd.github.v3+json'
-    } if os.environ.get('GITHUB_TOKEN') not in ["", None] else {
-        'Accept': 'application/vnd.github.v3+json'
-    }
-    # Get commit info from GitHub API
+# Same pattern create_dataset_file uses, so both find the same mirror for a URL
+GITHUB_URL_PATTERN = re.compile(r"github\.com[:/]([^/]+)/([^/]+)", re.IGNORECASE)
+FULL_COMMIT_HASH_PATTERN = re.compile(r"[0-9a-f]{40}")
+
+# Commits are immutable, so GitHub's answers for them can be kept forever. Only "unknown commit"
+# answers expire after a month, in case the commit gets pushed again
+GITHUB_CACHE_DIR = Path("resources/github_cache")
+MISSING_COMMIT_TTL = 30 * 24 * 60 * 60
+
+# Repos that couldn't be cloned are skipped by later runs too, until the failure is a week old
+FAILED_URLS_FILE = Path("resources/failed_urls.jsonl")
+FAILED_URL_RETRY_AFTER = 7 * 24 * 60 * 60
+
+# The token is read once, the headers for the GitHub API don't change during a run
+GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN') or None
+GITHUB_HEADERS = {'Accept': 'application/vnd.github.v3+json', **({'Authorization': f"token {GITHUB_TOKEN}"} if GITHUB_TOKEN else {})}
+GITHUB_DIFF_HEADERS = {**GITHUB_HEADERS, 'Accept': 'application/vnd.github.v3.diff'}
+
+# Environment for all git calls, computed once. Git must never wait for credentials or download LFS objects
+BASE_ENV = {**os.environ, "GIT_LFS_SKIP_SMUDGE": "1", "GIT_TERMINAL_PROMPT": "0"}
+
+# Shared by all threads, keeps the TLS connections to api.github.com alive across commits and repos.
+# request_with_backoff does all retrying for it
+github_session = create_session(pool_size=32, retries=False)
+
+def get_rate_limit_wait(response, num_tries):
+    """Seconds to wait before retrying a rate limited response, or None if it isn't rate limited."""
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is not None and retry_after.isdigit():
+        return int(retry_after) + random.uniform(0, 5)
+    if response.headers.get('X-RateLimit-Remaining') == '0' and response.headers.get('X-RateLimit-Reset', '').isdigit():
+        return max(0.0, int(response.headers['X-RateLimit-Reset']) - time.time()) + random.uniform(0, 5)
+    if response.status_code == 429 or "rate limit" in response.text.lower():
+        # Secondary rate limit without a hint, GitHub asks to wait at least a minute
+        return min(60.0 * 2 ** num_tries, 30.0 * 60.0) + random.uniform(0, 5)
+    return None
+
+def request_with_backoff(url, headers, method="GET", json_body=None, stream=False, max_backoff=300.0, max_tries=8):
+    """Request that sleeps until GitHub's rate limit resets and backs off exponentially on server/connection errors."""
+    num_tries = 0
     while True:
-        response = requests.get(api_url, headers=headers)
-
-        if response.status_code == 401:
-            print("Got 401, the used GITHUB_TOKEN is probably out of date.")
-
-        if response.status_code not in [403, 429]:
-            break
-        print(f"Got {response.status_code}, we're probably out of GitHub API calls. Setting the environment variable GITHUB_TOKEN might improve the situation.")
-        print("Waiting for 10 minutes.")
-        time.sleep(10.0 * 60.0)
+        try:
+            response = github_session.request(method, url, headers=headers, json=json_body, stream=stream, timeout=30)
+        except requests.RequestException as e:
+            if num_tries + 1 >= max_tries:
+                raise
+            wait = min(max_backoff, 2.0 ** num_tries) + random.uniform(0, 1)
+            reason = str(e)
+        else:
+            if response.status_code == 401:
+                print("Got 401, the used GITHUB_TOKEN is probably out of date.")
+
+            if response.status_code in [403, 429]:
+                wait = get_rate_limit_wait(response, num_tries)
+                if wait is None:
+                    return response # Not rate limited, just forbidden
+                print(f"Got {response.status_code}, we're probably out of GitHub API calls. Setting the environment variable GITHUB_TOKEN might improve the situation.")
+            elif response.status_code >= 500 and num_tries + 1 < max_tries:
+                wait = min(max_backoff, 2.0 ** num_tries) + random.uniform(0, 1)
+            else:
+                return response
+            reason = f"status {response.status_code}"
+
+        print(f"Request to {url} failed ({reason}), waiting {wait:.0f} seconds.")
+        time.sleep(wait)
+        num_tries += 1
         print("Trying again")
-    if response.status_code == 422:
-        return commit_hash
-    if response.status_code != 200:
-        print("api_url:", api_url)
-        raise Exception(f"Failed to get commit info: {response.status_code}")
-
-    commit_data = response.json()
-    parent_hash = commit_data['parents'][0]['sha']  # Assumes first parent
-
-    # Get the patch
-    diff_url = f"https://api.github.com/repos/{user_and_repo}/commits/{commit_hash}"
-    # print("patch_url:", diff_url)
-    diff_response = requests.get(diff_url, headers=headers)
-    if diff_response.status_code != 200:
-        print("diff_url:", diff_url)
-        raise Exception(f"Failed to get patch: {diff_response.status_code}")
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Clone the mirror to create a temporary working tree
-        subprocess.run(['git', 'clone', "--quiet", clone_dir, temp_dir], env={"GIT_LFS_SKIP_SMUDGE": "1"}, check=True)
 
-        # Create temporary file for patch
-        diff_file = os.path.join(temp_dir, 'commit.diff')
-        with open(diff_file, 'w') as f:
-            f.write(diff_response.text)
+@functools.lru_cache(maxsize=None)
+def parse_github_url(repo_url):
+    match = GITHUB_URL_PATTERN.search(repo_url)
+    if not match:
+        return None
+    return match.group(1), match.group(2)
 
-        # Change to temp directory
-        original_dir = os.getcwd()
-        os.chdir(temp_dir)
+def github_cache_path(repo_url, commit_hash, suffix):
+    user_name, repo_name = parse_github_url(repo_url)
+    return GITHUB_CACHE_DIR / user_name / repo_name / commit_hash[:2] / f"{commit_hash}{suffix}"
 
+def read_github_cache(repo_url, commit_hash, suffix):
+    try:
+        with open(github_cache_path(repo_url, commit_hash, suffix), encoding="utf-8", newline="") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def write_github_cache(repo_url, commit_hash, suffix, chunks):
+    path = github_cache_path(repo_url, commit_hash, suffix)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first so an interrupted run never leaves a truncated entry behind
+    with tempfile.NamedTemporaryFile("wb", dir=path.parent, delete=False) as f:
         try:
-            # Checkout parent commit
-            subprocess.run(['git', 'checkout', "--quiet", parent_hash], env={"GIT_LFS_SKIP_SMUDGE": "1"}, check=True)
-
-            # Apply the diff
-            subprocess.run(['git', 'apply', "--quiet", diff_file], check=True)
-
-            # Commit the changes
-            # First get the commit message from the API data
-            original_author = commit_data['commit']['author']
-            original_committer = commit_data['commit']['committer']
-            commit_msg = commit_data['commit']['message']
-
-            result = subprocess.run(['git', 'diff', '--name-only'],
-                                 capture_output=True, text=True, check=True)
-            changed_files = result.stdout.splitlines()
-
-            # Add only the changed files
-            for file in changed_files:
-                subprocess.run(['git', 'add', file], check=True)
-
-            # Create commit with original metadata
-            env = os.environ.copy()
-            env['GIT_AUTHOR_NAME'] = original_author['name']
-            env['GIT_AUTHOR_EMAIL'] = original_author['email']
-            env['GIT_AUTHOR_DATE'] = original_author['date']
-            env['GIT_COMMITTER_NAME'] = original_committer['name']
-            env['GIT_COMMITTER_EMAIL'] = original_committer['email']
-            env['GIT_COMMITTER_DATE'] = original_committer['date']
-
-            subprocess.run(['git', 'commit', "--quiet", '-m', commit_msg], env=env, check=True)
-
-            # Get the new commit hash
-            result = subprocess.run(['git', 'rev-parse', 'HEAD'],
-                                 capture_output=True, text=True, check=True)
-            new_commit = result.stdout.strip()
+            for chunk in chunks:
+                f.write(chunk)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+    return path
+
+def is_known_missing_commit(repo_url, commit_hash):
+    try:
+        return time.time() - github_cache_path(repo_url, commit_hash, ".missing").stat().st_mtime < MISSING_COMMIT_TTL
+    except FileNotFoundError:
+        return False
+
+def mark_missing_commit(repo_url, commit_hash):
+    write_github_cache(repo_url, commit_hash, ".missing", [])
+
+COMMIT_INFO_GRAPHQL_FIELDS = "... on Commit { oid parents(first: 1) { nodes { oid } } author { name email date } committer { name email date } message tree { oid } }"
+
+def fetch_commit_infos(repo_url, commit_hashes):
+    """
+    Gets the metadata of several commits with one GraphQL request, in the shape of the REST commit API.
+
+    Returns a dict from the requested hash to its metadata, commits GitHub doesn't know are left out.
+    Returns None if the GraphQL API can't be used (it requires a GITHUB_TOKEN), so callers fall back to REST.
+    Cached commits are answered from disk.
+    """
+    cached_commit_infos = {}
+    uncached_commit_hashes = []
+    for commit_hash in commit_hashes:
+        if is_known_missing_commit(repo_url, commit_hash):
+            continue
+        cached = read_github_cache(repo_url, commit_hash, ".json")
+        if cached is not None:
+            cached_commit_infos[commit_hash] = json.loads(cached)
+        else:
+            uncached_commit_hashes.append(commit_hash)
+
+    if not uncached_commit_hashes:
+        return cached_commit_infos
+    if GITHUB_TOKEN is None:
+        return None
+    commit_hashes = uncached_commit_hashes
+
+    owner, name = parse_github_url(repo_url)
+    aliases = "\n".join(f"c{i}: object(expression: $c{i}) {{ {COMMIT_INFO_GRAPHQL_FIELDS} }}" for i in range(len(commit_hashes)))
+    variables_decl = "".join(f", $c{i}: String!" for i in range(len(commit_hashes)))
+    query = f"query($owner: String!, $name: String!{variables_decl}) {{ repository(owner: $owner, name: $name) {{ {aliases} }} }}"
+    variables = {"owner": owner, "name": name, **{f"c{i}": commit_hash for i, commit_hash in enumerate(commit_hashes)}}
+
+    # Any failure here falls back to the REST path instead of aborting the whole run
+    try:
+        response = request_with_backoff("https://api.github.com/graphql", GITHUB_HEADERS, method="POST", json_body={"query": query, "variables": variables})
+        if response.status_code != 200:
+            print(f"GraphQL request for {repo_url} failed: {response.status_code}")
+            return None
+        content = response.json()
+    except (requests.RequestException, ValueError) as e:
+        print(f"GraphQL request for {repo_url} failed: {e}")
+        return None
+    repository = (content.get("data") or {}).get("repository")
+    if repository is None:
+        print(f"GraphQL request for {repo_url} returned no repository: {content.get('errors')}")
+        return None
+
+    commit_infos = cached_commit_infos
+    for i, commit_hash in enumerate(commit_hashes):
+        commit = repository.get(f"c{i}")
+        if commit is None or "oid" not in commit:
+            mark_missing_commit(repo_url, commit_hash)
+            continue
+        commit_infos[commit_hash] = {
+            'sha': commit['oid'],
+            'parents': [{'sha': parent['oid']} for parent in commit['parents']['nodes']],
+            'commit': {
+                'author': commit['author'],
+                'committer': commit['committer'],
+                'message': commit['message'],
+                'tree': {'sha': commit['tree']['oid']},
+            },
+        }
+        write_github_cache(repo_url, commit_hash, ".json", [json.dumps(commit_infos[commit_hash]).encode()])
+    return commit_infos
+
+def add_orphaned_commit(clone_dir, repo_url, commit_hash, commit_data=None):
+    # Extract commit hash from URL
+    # commit_hash = commit_url.rstrip('/').split('/')[-1]
 
-            result = subprocess.run(['git', 'diff', parent_hash],
-                                 capture_output=True, text=True, check=True)
+    # Setup API URL
+    user_name, repo_name = parse_github_url(repo_url)
+    api_url = f"https://api.github.com/repos/{user_name}/{repo_name}/commits/{commit_hash}"
 
-            original_diff = diff_response.text.replace("\r", "")
-            new_diff = result.stdout.replace("\r", "")
+    # print("api_url:", api_url)
 
-            if original_diff == new_diff:
+    # Get commit info from the cache or GitHub API, unless it was already fetched in a batch
+    if commit_data is None:
+        cached = read_github_cache(repo_url, commit_hash, ".json")
+        if cached is not None:
+            commit_data = json.loads(cached)
+        else:
+            response = request_with_backoff(api_url, GITHUB_HEADERS)
+            if response.status_code == 422:
+                mark_missing_commit(repo_url, commit_hash)
+                return commit_hash
+            if response.status_code != 200:
+                print("api_url:", api_url)
+                raise Exception(f"Failed to get commit info: {response.status_code}")
+            commit_data = response.json()
+            write_github_cache(repo_url, commit_hash, ".json", [response.content])
 
+    parent_hash = commit_data['parents'][0]['sha']  # Assumes first parent
 
-                # Push the new commit back to the mirror
-                branch_name = f"orphaned-{commit_hash[:7]}"
-                subprocess.run(['git', 'push', "--quiet", 'origin', f'{new_commit}:refs/heads/{branch_name}'],
-                            check=True)
+    # Get the patch, same endpoint but as a raw diff that `git apply` understands. It is streamed
+    # straight into the cache, which `git apply` then reads
+    diff_file = github_cache_path(repo_url, commit_hash, ".diff")
+    if not diff_file.exists():
+        diff_response = request_with_backoff(api_url, GITHUB_DIFF_HEADERS, stream=True)
+        if diff_response.status_code == 422:
+            mark_missing_commit(repo_url, commit_hash)
+            return commit_hash
+        if diff_response.status_code != 200:
+            print("api_url:", api_url)
+            raise Exception(f"Failed to get patch: {diff_response.status_code}")
+        write_github_cache(repo_url, commit_hash, ".diff", diff_response.iter_content(chunk_size=1 << 16))
+    diff_file = os.path.abspath(diff_file)
 
-        finally:
-            os.chdir(original_dir)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # The commit is built in a temporary index directly in the mirror's object database, no files get checked out
+        index_env = {**BASE_ENV, 'GIT_INDEX_FILE': os.path.join(temp_dir, 'index')}
+
+        # Apply the diff on top of the parent commit
+        subprocess.run(['git', '-C', clone_dir, 'read-tree', parent_hash], env=index_env, check=True)
+        subprocess.run(['git', '-C', clone_dir, 'apply', "--quiet", '--cached', diff_file], env=index_env, check=True)
+        tree = subprocess.run(['git', '-C', clone_dir, 'write-tree'], env=index_env,
+                              capture_output=True, check=True).stdout.strip().decode('ascii')
+
+        # Same tree as the original commit means the patch was applied exactly. Otherwise no commit is created
+        # and the original hash is reported, which doesn't exist in the mirror
+        if tree != commit_data['commit']['tree']['sha']:
+            print(f"WARNING: Patched tree of {commit_hash} doesn't match the original tree")
+            return commit_hash
+
+        # Commit the changes
+        # First get the commit message from the API data
+        original_author = commit_data['commit']['author']
+        original_committer = commit_data['commit']['committer']
+        commit_msg = commit_data['commit']['message']
+
+        # Create commit with original metadata
+        env = {
+            **BASE_ENV,
+            'GIT_AUTHOR_NAME': original_author['name'],
+            'GIT_AUTHOR_EMAIL': original_author['email'],
+            'GIT_AUTHOR_DATE': original_author['date'],
+            'GIT_COMMITTER_NAME': original_committer['name'],
+            'GIT_COMMITTER_EMAIL': original_committer['email'],
+            'GIT_COMMITTER_DATE': original_committer['date'],
+        }
+
+        result = subprocess.run(['git', '-C', clone_dir, 'commit-tree', tree, '-p', parent_hash, '-m', commit_msg], env=env,
+                                capture_output=True, check=True)
+        new_commit = result.stdout.strip().decode('ascii')
+
+        # A branch keeps the new commit reachable in the mirror. It is named after the full original hash,
+        # update-ref would silently move a branch shared by two commits with the same short hash
+        branch_name = f"orphaned-{commit_data['sha']}"
+        subprocess.run(['git', '-C', clone_dir, 'update-ref', f'refs/heads/{branch_name}', new_commit], env=BASE_ENV, check=True)
 
     return new_commit
 
-def commit_exists(clone_dir, commit):
-    return subprocess.run(["git", "-C", clone_dir, "cat-file", "-e", commit], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+def fetch_orphaned_commit(clone_dir, commit_hash):
+    # Git can only fetch a commit by its full hash. The branch keeps it reachable, like a recreated commit
+    branch_name = f"orphaned-{commit_hash}"
+    return subprocess.run(["git", "--git-dir", clone_dir, "fetch", "--quiet", "--no-tags", "origin", f"{commit_hash}:refs/heads/{branch_name}"],
+                          env=BASE_ENV, stderr=subprocess.DEVNULL).returncode == 0
+
+class GitCatFileBatch:
+    """Answers many existence checks for a repo with one long-lived `git cat-file --batch-check` process."""
+
+    def __init__(self, clone_dir):
+        self.clone_dir = clone_dir
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(["git", "-C", self.clone_dir, "cat-file", "--batch-check=%(objectname) %(objecttype)"],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=BASE_ENV)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.process.stdin.close()
+        self.process.wait()
+
+    def exists(self, commit):
+        # Each query is one line, anything with whitespace in it can't be an object name
+        if not commit or any(c.isspace() for c in commit):
+            return False
+        self.process.stdin.write(commit.encode() + b"\n")
+        self.process.stdin.flush()
+        # "<sha> <type>" if found, "<name> missing" or "<name> ambiguous" otherwise
+        response = self.process.stdout.readline().split()
+        return len(response) == 2 and response[1] not in (b"missing", b"ambiguous")
+
+def commit_exists_or_find_it(clone_dir, repo_url, commit, cat_file, commit_infos=None):
+    if cat_file.exists(commit):
+        return commit, True
+
+    # GitHub recently answered that it doesn't know this commit, or the batch lookup didn't find it
+    if is_known_missing_commit(repo_url, commit) or (commit_infos is not None and commit not in commit_infos):
+        return commit, False
 
-def commit_exists_or_find_it(clone_dir, repo_url, commit):
-    if commit_exists(clone_dir, commit):
+    # GitHub still serves commits no ref points to anymore (e.g. force-pushed PR commits) by their hash,
+    # which is much cheaper than recreating them from their patch. The mirror already has all refs/pull/*
+    full_hash = commit if FULL_COMMIT_HASH_PATTERN.fullmatch(commit) else (commit_infos or {}).get(commit, {}).get('sha')
+    if full_hash is not None and fetch_orphaned_commit(clone_dir, full_hash) and cat_file.exists(commit):
         return commit, True
 
     try:
-        commit = add_orphaned_commit(clone_dir, repo_url, commit)
+        commit = add_orphaned_commit(clone_dir, repo_url, commit, None if commit_infos is None else commit_infos[commit])
     except Exception as e:
         print(repo_url, commit)
         print(e)
 
-    return commit, commit_exists(clone_dir, commit)
+    return commit, cat_file.exists(commit)
 
-failed_urls = set()
+def load_failed_urls():
+    failed = set()
+    try:
+        with open(FAILED_URLS_FILE) as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if time.time() - entry["time"] < FAILED_URL_RETRY_AFTER:
+                    failed.add(entry["url"])
+    except FileNotFoundError:
+        pass
+    return failed
+
+def record_failed_url(repo_url):
+    with failed_urls_lock:
+        failed_urls.add(repo_url)
+    # Appends are locked, so parallel runs can share the file
+    FAILED_URLS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(FAILED_URLS_FILE, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.write(json.dumps({"url": repo_url, "time": time.time()}) + "\n")
+
+def get_clone_dir(git_repo_dir, repo_url):
+    parsed_url = parse_github_url(repo_url)
+    user_name, repo_name = parsed_url if parsed_url is not None else repo_url.split('/')[-2:]
+    return os.path.join(git_repo_dir, user_name, repo_name)
+
+failed_urls = load_failed_urls()
+failed_urls_lock = threading.Lock()
 
 # Function to mirror repo and check commits
 def mirror_and_check_commits(git_repo_dir, repo_url, commit1, commit2):
     assert "https://" in repo_url
 
-    if repo_url in failed_urls:
-        return commit1, commit2, False
+    with failed_urls_lock:
+        if repo_url in failed_urls:
+            return commit1, commit2, False
 
-    user_name, repo_name = repo_url.split('/')[-2:]
-    clone_dir = os.path.join(git_repo_dir, user_name, repo_name)
+    parsed_url = parse_github_url(repo_url)
+    clone_dir = get_clone_dir(git_repo_dir, repo_url)
 
     # Clone (mirror) the repo
+    cloned = False
     if not Path(clone_dir).exists():
-        status = subprocess.run(["git", "clone", "--quiet", "--mirror", repo_url + ".git", clone_dir], env={"GIT_TERMINAL_PROMPT": "0"}).returncode
+        status = subprocess.run(["git", "clone", "--quiet", "--mirror", repo_url + ".git", clone_dir], env=BASE_ENV).returncode
         if status != 0:
             print(f"Couldn't clone repo {repo_url}, status: {status}")
-            failed_urls.add(repo_url)
+            record_failed_url(repo_url)
             return commit1, commit2, False
-    else:
-        status = subprocess.run(["git", "--git-dir", clone_dir,  "remote", "update"], env={"GIT_TERMINAL_PROMPT": "0"}, stderr=subprocess.DEVNULL).returncode
-        if status != 0:
-            print(f"WARNING: Couldn't update repo {repo_url}, status: {status}")
+        cloned = True
+
+    # Check if both commits exist in the mirror, the metadata of missing ones is fetched in one batch
+
+    with GitCatFileBatch(clone_dir) as cat_file:
+        missing_commits = [commit for commit in dict.fromkeys([commit1, commit2]) if not cat_file.exists(commit)]
 
+        # An existing mirror only needs to be updated if it lacks one of the commits, and not if GitHub doesn't know them
+        if not cloned and any(parsed_url is None or not is_known_missing_commit(repo_url, commit) for commit in missing_commits):
+            status = subprocess.run(["git", "--git-dir", clone_dir,  "remote", "update"], env=BASE_ENV, stderr=subprocess.DEVNULL).returncode
+            if status != 0:
+                print(f"WARNING: Couldn't update repo {repo_url}, status: {status}")
+            missing_commits = [commit for commit in missing_commits if not cat_file.exists(commit)]
 
-    # Check if both commits exist in the mirror
+        # Only GitHub's API can recover commits that are missing from the mirror
+        if parsed_url is None:
+            return commit1, commit2, not missing_commits
 
-    commit1, commit1_exists = commit_exists_or_find_it(clone_dir, repo_url, commit1)
-    commit2, commit2_exists = commit_exists_or_find_it(clone_dir, repo_url, commit2)
+        commit_infos = fetch_commit_infos(repo_url, missing_commits) if missing_commits else {}
+
+        commit1, commit1_exists = commit_exists_or_find_it(clone_dir, repo_url, commit1, cat_file, commit_infos)
+        commit2, commit2_exists = commit_exists_or_find_it(clone_dir, repo_url, commit2, cat_file, commit_infos)
 
     return commit1, commit2, commit1_exists and commit2_exists
+
+def mirror_and_check_commits_batch(items, max_workers=None):
+    """
+    Runs mirror_and_check_commits for many (git_repo_dir, repo_url, commit1, commit2) tuples in parallel.
+
+    Items whose URLs map to the same mirror are checked one after another by the same worker.
+    Returns the results in the order of the items.
+    """
+    if max_workers is None:
+        max_workers = max(2, (os.cpu_count() or 1) * 3 // 4)
+
+    indices_by_repo = {}
+    for i, (git_repo_dir, repo_url, _, _) in enumerate(items):
+        indices_by_repo.setdefault(get_clone_dir(git_repo_dir, repo_url), []).append(i)
+
+    results = [None] * len(items)
+
+    def check_repo(indices):
+        for i in indices:
+            results[i] = mirror_and_check_commits(*items[i])
+            progress_bar.update()
+
+    with tqdm(total=len(items), leave=False) as progress_bar, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for future in [executor.submit(check_repo, indices) for indices in indices_by_repo.values()]:
+            future.result()
+
+    return results
@@ -0,0 +1,36 @@
+import os
+import re
+import shutil
+from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+def is_git_object_file(path):
+    # Packs and loose objects, the only files git never modifies after writing them
+    parent = Path(path).parent
+    return parent.parent.name == "objects" and (parent.name == "pack" or re.fullmatch("[0-9a-f]{2}", parent.name) is not None)
+
+def link_or_copy(src, dst):
+    # Hard links make backups of the mirrors' object files instant. Everything else is copied, since e.g.
+    # git rewrites FETCH_HEAD in place and that would change the backup too
+    if is_git_object_file(src):
+        try:
+            os.link(src, dst)
+            return dst
+        except OSError:
+            pass # Across filesystems
+    return shutil.copy2(src, dst)
+
+def create_session(pool_size=4, retries=True):
+    # Reuses connections across requests and retries transient server errors with backoff, unless the caller retries itself
+    session = requests.Session()
+    session.headers.update({"User-Agent": "engine_commit_data/1.0"})
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504]) if retries else 0
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session